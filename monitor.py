@@ -1,19 +1,180 @@
 import sys
 import os
-import psutil
+import time
+import threading
+import queue
+from collections import deque
 import hid
-import win32pdh  # For Windows Performance Counters
 from PySide6.QtWidgets import QApplication, QDialog, QSystemTrayIcon, QMenu, QMessageBox
 from PySide6.QtGui import QIcon, QAction
-from PySide6.QtCore import Slot, QTimer, Qt
+from PySide6.QtCore import Slot, Signal, QThread, QTimer, Qt
+from monitor_core import (
+    CpuSampler,
+    HidSession,
+    construct_data,
+    get_system_metrics,
+    send_raw_report,
+)
 from monitor_ui import Ui_Dialog
 
-# Replace with your device-specific values
-VENDOR_ID = 0xA743  # Your device's Vendor ID
-PRODUCT_ID = 0x0260  # Your device's Product ID
-USAGE_PAGE = 0xFF60
-USAGE = 0x61
-REPORT_LENGTH = 32
+EXPECT_RESPONSE = False  # Set if the firmware answers the CPU/RAM command
+LOG_LINES = 256  # Status lines kept in the dialog
+VISIBLE_INTERVAL = 1000  # ms between samples while the window is shown
+HIDDEN_INTERVAL = 5000  # ms between samples while in the tray
+
+# Dynamically load the icon path (bundled next to the exe when frozen)
+ICON_PATH = os.path.join(
+    getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(__file__))),
+    "monitoring.png",
+)
+_icon = None  # Created on first use, once a QApplication exists
+
+
+class MetricsWorker(QThread):
+    """Own the HID device and CPU counter on one long-lived background thread.
+
+    The dialog asks for connects and disconnects with request_connect() and
+    request_disconnect(), so every PDH and HID call happens on this thread.
+    """
+
+    statusMessage = Signal(str)
+    responsesReceived = Signal(object)  # List of response reports drained in one tick
+
+    def __init__(self, parent=None):
+        super(MetricsWorker, self).__init__(parent)
+        self.interval = VISIBLE_INTERVAL  # ms between samples
+        self._stopping = False
+        self._wake_event = threading.Event()
+        self._requests = queue.SimpleQueue()
+        self.forward_responses = True  # Cleared while nobody can see the log
+
+        self.session = HidSession()
+        self.cpu_sampler = None
+        self._last_tick = 0.0  # monotonic start of the last tick
+        self._last_sample = 0.0  # monotonic time of the last sample or sampler baseline
+        self._last_sent = (None, None)  # Last (cpu, ram) shown on the device
+
+    def stop(self):
+        """Ask the thread to release the device and exit; call wait() to join it."""
+        self._stopping = True
+        self._wake_event.set()
+
+    def set_interval(self, interval):
+        """Change the sampling interval, counted from the start of the last tick."""
+        self.interval = interval
+        self._wake_event.set()
+
+    def request_connect(self):
+        """Queue a connect; it runs on the worker thread."""
+        self._requests.put(self.connect_device)
+        self._wake_event.set()
+
+    def request_disconnect(self):
+        """Queue a disconnect; it runs on the worker thread."""
+        self._requests.put(self.disconnect_device)
+        self._wake_event.set()
+
+    def run(self):
+        try:
+            while not self._stopping:
+                started = time.monotonic()
+                while not self._requests.empty():
+                    request = self._requests.get()
+                    # A failed request must not end the thread, or later ones go unanswered
+                    try:
+                        request()
+                    except Exception as e:
+                        self.statusMessage.emit(f"Request failed: {e}")
+                if self.session.device is not None and self.cpu_sampler is not None:
+                    # Requests and interval changes only move the deadline;
+                    # the sampler still needs a real window since its last read
+                    due = max(self._last_tick + self.interval / 1000,
+                              self._last_sample + CpuSampler.MIN_INTERVAL)
+                    if started >= due:
+                        self._last_tick = self._last_sample = started
+                        self.send_tick()
+                        due = started + max(self.interval / 1000, CpuSampler.MIN_INTERVAL)
+                    timeout = max(0.0, due - time.monotonic())
+                else:
+                    timeout = None  # Nothing to do until the next request
+                self._wake_event.wait(timeout)
+                self._wake_event.clear()
+        finally:
+            if self.cpu_sampler is not None:
+                self.cpu_sampler.close()
+            self.session.close()
+
+    def connect_device(self):
+        """Handle connection to HID device."""
+        # Opened on the first connect, and re-opened on the next one after a failure
+        if self.cpu_sampler is None:
+            try:
+                self.cpu_sampler = CpuSampler()
+            except OSError as e:
+                self.statusMessage.emit(f"Cannot read CPU usage: {e}")
+                return
+            self._last_sample = time.monotonic()  # The constructor took the baseline
+
+        if self.session.device is not None:
+            self.statusMessage.emit("Already connected.")
+            return
+
+        try:
+            interface = self.session.open()
+        except (OSError, hid.HIDException) as e:
+            self.statusMessage.emit(f"Cannot open device: {e}")
+            return
+        if interface is None:
+            self.statusMessage.emit("No device found. Check if device is plugged in and correct VID/PID/usage values.")
+            return
+        self._last_sent = (None, None)  # Always refresh a fresh connection
+        self.statusMessage.emit(f"Connected to device: {interface.manufacturer} {interface.product}")
+
+    def disconnect_device(self):
+        """Handle disconnection from HID device."""
+        if self.session.device is None:
+            self.statusMessage.emit("No active connection to disconnect.")
+            return
+        self.session.close()
+        self.statusMessage.emit("Disconnected from HID device.")
+
+    def send_tick(self):
+        """Sample and send once, dropping the sampler or the device if it fails."""
+        try:
+            cpu, ram = get_system_metrics(self.cpu_sampler)
+        except OSError as e:
+            # The device is fine; stop sampling until the next connect re-opens the counter
+            self.cpu_sampler.close()
+            self.cpu_sampler = None
+            self.statusMessage.emit(f"CPU counter error: {e}. Press Connect to retry.")
+            return
+        try:
+            if EXPECT_RESPONSE:
+                self.poll_responses()
+            self.send_system_metrics(cpu, ram)
+        except (OSError, hid.HIDException) as e:
+            self.session.close()
+            self.statusMessage.emit(f"Lost connection to device: {e}")
+
+    def poll_responses(self):
+        """Drain the responses queued since the last tick without waiting for more."""
+        responses = []
+        while True:
+            response_report = self.session.read(timeout=0)
+            if not response_report:
+                break
+            responses.append(response_report)
+        # One queued call per tick at most, and none while in the tray
+        if responses and self.forward_responses:
+            self.responsesReceived.emit(responses)
+
+    def send_system_metrics(self, cpu, ram):
+        """Send system metrics to the device."""
+        # The device keeps showing the last values, so skip identical reports
+        if (cpu, ram) == self._last_sent:
+            return
+        send_raw_report(self.session, construct_data(cpu, ram))
+        self._last_sent = (cpu, ram)
 
 
 class MonitorDialog(QDialog):
@@ -22,12 +183,20 @@ class MonitorDialog(QDialog):
         self.ui = Ui_Dialog()
         self.ui.setupUi(self)
 
-        # Dynamically load the icon path
-        base_path = getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(__file__)))
-        icon_path = os.path.join(base_path, "monitoring.png")
-
-        # Set the application window icon
-        self.setWindowIcon(QIcon(icon_path))
+        # Keep the status log bounded and redraw it at most once per second
+        self.ui.statusBar.document().setMaximumBlockCount(LOG_LINES)
+        # Lines not yet shown; older ones would fall off the document anyway
+        self._log_q = deque(maxlen=LOG_LINES)
+        self.log_timer = QTimer(self)
+        self.log_timer.setSingleShot(True)
+        self.log_timer.setInterval(1000)
+        self.log_timer.timeout.connect(self.flush_log)
+
+        # Set the application window icon; the tray reuses the same QIcon
+        global _icon
+        if _icon is None:
+            _icon = QIcon(ICON_PATH)
+        self.setWindowIcon(_icon)
 
         # Set the application window title
         self.setWindowTitle("computer monitor")
@@ -35,25 +204,20 @@ class MonitorDialog(QDialog):
         # Enable minimize and close buttons
         self.setWindowFlags(Qt.Window | Qt.WindowMinimizeButtonHint | Qt.WindowCloseButtonHint)
 
-        self.hid_interface = None
-
-        # Initialize Windows Performance Counter for CPU
-        self.cpu_query_handle = None
-        self.cpu_counter_handle = None
-        self.is_first_sample = True  # Equivalent to m_first_get_CPU_utility in C++
-        self.initialize_cpu_counter()
-
-        # Set up the timer for sending metrics every second
-        self.timer = QTimer(self)
-        self.timer.setInterval(1000)  # 1000 ms = 1 second
-        self.timer.timeout.connect(self.send_system_metrics)
+        # Background thread that owns the device and samples while connected
+        self.worker = MetricsWorker(self)
+        self.worker.interval = HIDDEN_INTERVAL  # Until the window is shown
+        self.worker.forward_responses = False
+        self.worker.statusMessage.connect(self.log_status)
+        self.worker.responsesReceived.connect(self.log_responses)
+        self.worker.start()
 
         # Connect UI buttons
         self.ui.connectBtm.clicked.connect(self.handle_connect)
         self.ui.disconnectBtm.clicked.connect(self.handle_disconnect)
 
         # Add tray icon and menu
-        self.tray_icon = QSystemTrayIcon(QIcon(icon_path), self)
+        self.tray_icon = QSystemTrayIcon(_icon, self)
         self.tray_menu = QMenu(self)
 
         self.show_action = QAction("Show", self)
@@ -72,105 +236,54 @@ class MonitorDialog(QDialog):
         self.handle_connect()
 
     def log_status(self, message: str):
-        """Append a status message to the QTextBrowser."""
-        self.ui.statusBar.append(message)
-
-    def initialize_cpu_counter(self):
-        """Initialize performance counter for CPU usage."""
-        self.cpu_query_handle = win32pdh.OpenQuery()
-        windows_version = sys.getwindowsversion().major
-        if windows_version >= 10:
-            query_str = "\\Processor Information(_Total)\\% Processor Utility"
-        else:
-            query_str = "\\Processor Information(_Total)\\% Processor Time"
-        self.cpu_counter_handle = win32pdh.AddCounter(
-            self.cpu_query_handle, query_str
-        )
-        # Collect initial data to establish a baseline
-        win32pdh.CollectQueryData(self.cpu_query_handle)
-
-    def get_cpu_usage(self):
-        """Fetch CPU usage using two-point calculation logic."""
-        win32pdh.CollectQueryData(self.cpu_query_handle)
-        _, formatted_value = win32pdh.GetFormattedCounterValue(
-            self.cpu_counter_handle, win32pdh.PDH_FMT_DOUBLE
-        )
-        if self.is_first_sample:
-            self.is_first_sample = False
-            return 0
-        return round(formatted_value)
-
-    def get_hid_interface(self):
-        device_interfaces = hid.enumerate(VENDOR_ID, PRODUCT_ID)
-        raw_hid_interfaces = [
-            i for i in device_interfaces
-            if i["usage_page"] == USAGE_PAGE and i["usage"] == USAGE
-        ]
-        if not raw_hid_interfaces:
-            return None
-        return hid.Device(path=raw_hid_interfaces[0]["path"])
+        """Queue a status message for the QTextBrowser."""
+        self._log_q.append(message)
+        if not self.log_timer.isActive():
+            self.log_timer.start()
 
     @Slot()
-    def handle_connect(self):
-        """Handle connection to HID device."""
-        if self.hid_interface is not None:
-            self.log_status("Already connected.")
+    def flush_log(self):
+        """Append the status messages queued since the last flush in one update."""
+        # Leave the text stale while hidden; show_window flushes it
+        if not self._log_q or not self.isVisible():
             return
+        self.ui.statusBar.append("\n".join(self._log_q))
+        self._log_q.clear()
 
-        self.hid_interface = self.get_hid_interface()
-        if self.hid_interface:
-            self.log_status(f"Connected to device: {self.hid_interface.manufacturer} {self.hid_interface.product}")
-            self.timer.start()
-        else:
-            self.log_status("No device found. Check if device is plugged in and correct VID/PID/usage values.")
+    @Slot(object)
+    def log_responses(self, responses):
+        """Log the device's responses to the last reports."""
+        for response_report in responses:
+            self.log_status("Received: " + response_report.hex(" ").upper())
+
+    @Slot()
+    def handle_connect(self):
+        """Handle connection to HID device."""
+        self.worker.request_connect()
 
     @Slot()
     def handle_disconnect(self):
         """Handle disconnection from HID device."""
-        if self.hid_interface:
-            self.timer.stop()
-            self.hid_interface.close()
-            self.hid_interface = None
-            self.log_status("Disconnected from HID device.")
-        else:
-            self.log_status("No active connection to disconnect.")
-
-    def get_system_metrics(self):
-        """Fetch system metrics: CPU and RAM usage."""
-        cpu_percent = self.get_cpu_usage()
-        ram_percent = int(psutil.virtual_memory().percent)
-        return cpu_percent, ram_percent
-
-    def send_raw_report(self, data):
-        """Send a HID report to the device and read the response."""
-        if not self.hid_interface:
-            self.log_status("Not connected to any device.")
-            return
-
-        request_data = [0x00] * (REPORT_LENGTH + 1)
-        request_data[1 : len(data) + 1] = data
-        request_report = bytes(request_data)
-        self.hid_interface.write(request_report)
-        response_report = self.hid_interface.read(REPORT_LENGTH, timeout=500)
-
-        if response_report:
-            res_hex = " ".join(f"0x{byte:02X}" for byte in response_report)
-            self.log_status(f"Received: {res_hex}")
-        else:
-            self.log_status("No response received.")
-
-    def send_system_metrics(self):
-        """Send system metrics to the device."""
-        if not self.hid_interface:
-            return
-        cpu, ram = self.get_system_metrics()
-        data = [0x01, cpu & 0xFF, ram & 0xFF]
-        self.send_raw_report(data)
+        self.worker.request_disconnect()
 
     def show_window(self):
         """Show the main window."""
         self.show()
         self.raise_()
+        self.flush_log()
+
+    def showEvent(self, event):
+        """Sample at full rate while the window can be seen."""
+        super(MonitorDialog, self).showEvent(event)
+        self.worker.forward_responses = True
+        self.worker.set_interval(VISIBLE_INTERVAL)
+
+    def hideEvent(self, event):
+        """Sample less often while only the keyboard shows the values."""
+        super(MonitorDialog, self).hideEvent(event)
+        # Nobody can read the log while the window is in the tray
+        self.worker.forward_responses = False
+        self.worker.set_interval(HIDDEN_INTERVAL)
 
     def closeEvent(self, event):
         """Handle close button: minimize to tray or fully exit."""
@@ -200,6 +313,8 @@ class MonitorDialog(QDialog):
     @Slot()
     def handle_exit(self):
         """Exit the application."""
+        self.worker.stop()
+        self.worker.wait()  # Let the worker release the device
         self.tray_icon.hide()
         QApplication.quit()  # Cleanly exits the application
 
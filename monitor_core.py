@@ -0,0 +1,476 @@
+"""Device and system metrics helpers shared by the monitor app and test script."""
+import sys
+import ctypes
+import hid
+
+# Replace with your device-specific values
+VENDOR_ID = 0xA743  # Your device's Vendor ID
+PRODUCT_ID = 0x0260  # Your device's Product ID
+USAGE_PAGE = 0xFF60
+USAGE = 0x61
+REPORT_LENGTH = 32  # HID report length
+
+if sys.platform == "win32":
+    from ctypes import wintypes
+
+    # CPU counter path, resolved once. "Processor Information" counters have no
+    # fixed perf index, so they are added by English name instead of localized name
+    if sys.getwindowsversion().major >= 10:
+        CPU_COUNTER_PATH = "\\Processor Information(_Total)\\% Processor Utility"
+    else:
+        CPU_COUNTER_PATH = "\\Processor Information(_Total)\\% Processor Time"
+
+    # Counter type of "% Processor Time"; "% Processor Utility" is an averaged counter
+    PERF_100NSEC_TIMER_INV = 0x21510500
+
+    class PDH_RAW_COUNTER(ctypes.Structure):
+        _fields_ = [
+            ("CStatus", wintypes.DWORD),
+            ("TimeStamp", wintypes.FILETIME),
+            ("FirstValue", ctypes.c_longlong),
+            ("SecondValue", ctypes.c_longlong),
+            ("MultiCount", wintypes.DWORD),
+        ]
+
+    def _check_pdh_status(status, func, args):
+        if status != 0:
+            raise OSError(f"{func.__name__} failed: 0x{status & 0xFFFFFFFF:08X}")
+        return args
+
+    # Windows Performance Counters, bound directly instead of through pywin32
+    _pdh = ctypes.WinDLL("pdh")
+    _pdh.PdhOpenQueryW.argtypes = [
+        wintypes.LPCWSTR,
+        ctypes.c_size_t,
+        ctypes.POINTER(wintypes.HANDLE),
+    ]
+    _pdh.PdhAddEnglishCounterW.argtypes = [
+        wintypes.HANDLE,
+        wintypes.LPCWSTR,
+        ctypes.c_size_t,
+        ctypes.POINTER(wintypes.HANDLE),
+    ]
+    _pdh.PdhCollectQueryData.argtypes = [wintypes.HANDLE]
+    _pdh.PdhGetRawCounterValue.argtypes = [
+        wintypes.HANDLE,
+        ctypes.POINTER(wintypes.DWORD),
+        ctypes.POINTER(PDH_RAW_COUNTER),
+    ]
+    _pdh.PdhCloseQuery.argtypes = [wintypes.HANDLE]
+    for _func in (
+        _pdh.PdhOpenQueryW,
+        _pdh.PdhAddEnglishCounterW,
+        _pdh.PdhCollectQueryData,
+        _pdh.PdhGetRawCounterValue,
+        _pdh.PdhCloseQuery,
+    ):
+        _func.restype = wintypes.LONG
+        _func.errcheck = _check_pdh_status
+
+    GENERIC_READ = 0x80000000
+    GENERIC_WRITE = 0x40000000
+    FILE_SHARE_READ = 0x1
+    FILE_SHARE_WRITE = 0x2
+    OPEN_EXISTING = 3
+    FILE_FLAG_OVERLAPPED = 0x40000000
+    INVALID_HANDLE_VALUE = wintypes.HANDLE(-1).value
+    ERROR_IO_PENDING = 997
+    WAIT_OBJECT_0 = 0
+    WAIT_TIMEOUT = 0x102
+    WAIT_FAILED = 0xFFFFFFFF
+    INFINITE = 0xFFFFFFFF
+    WRITE_TIMEOUT = 1000  # ms, same limit hidapi uses
+
+    class OVERLAPPED(ctypes.Structure):
+        _fields_ = [
+            ("Internal", ctypes.c_size_t),
+            ("InternalHigh", ctypes.c_size_t),
+            ("Offset", wintypes.DWORD),
+            ("OffsetHigh", wintypes.DWORD),
+            ("hEvent", wintypes.HANDLE),
+        ]
+
+    _kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    _kernel32.CreateFileW.argtypes = [
+        wintypes.LPCWSTR,
+        wintypes.DWORD,
+        wintypes.DWORD,
+        wintypes.LPVOID,
+        wintypes.DWORD,
+        wintypes.DWORD,
+        wintypes.HANDLE,
+    ]
+    _kernel32.CreateFileW.restype = wintypes.HANDLE
+    _kernel32.CreateEventW.argtypes = [
+        wintypes.LPVOID,
+        wintypes.BOOL,
+        wintypes.BOOL,
+        wintypes.LPCWSTR,
+    ]
+    _kernel32.CreateEventW.restype = wintypes.HANDLE
+    _kernel32.WriteFile.argtypes = [
+        wintypes.HANDLE,
+        wintypes.LPCVOID,
+        wintypes.DWORD,
+        wintypes.LPDWORD,
+        ctypes.POINTER(OVERLAPPED),
+    ]
+    _kernel32.WriteFile.restype = wintypes.BOOL
+    _kernel32.ReadFile.argtypes = [
+        wintypes.HANDLE,
+        wintypes.LPVOID,
+        wintypes.DWORD,
+        wintypes.LPDWORD,
+        ctypes.POINTER(OVERLAPPED),
+    ]
+    _kernel32.ReadFile.restype = wintypes.BOOL
+    _kernel32.GetOverlappedResult.argtypes = [
+        wintypes.HANDLE,
+        ctypes.POINTER(OVERLAPPED),
+        wintypes.LPDWORD,
+        wintypes.BOOL,
+    ]
+    _kernel32.GetOverlappedResult.restype = wintypes.BOOL
+    _kernel32.WaitForSingleObject.argtypes = [wintypes.HANDLE, wintypes.DWORD]
+    _kernel32.WaitForSingleObject.restype = wintypes.DWORD
+    _kernel32.CancelIoEx.argtypes = [wintypes.HANDLE, ctypes.POINTER(OVERLAPPED)]
+    _kernel32.CancelIoEx.restype = wintypes.BOOL
+    _kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+    _kernel32.CloseHandle.restype = wintypes.BOOL
+
+    class MEMORYSTATUSEX(ctypes.Structure):
+        _fields_ = [
+            ("dwLength", wintypes.DWORD),
+            ("dwMemoryLoad", wintypes.DWORD),
+            ("ullTotalPhys", ctypes.c_ulonglong),
+            ("ullAvailPhys", ctypes.c_ulonglong),
+            ("ullTotalPageFile", ctypes.c_ulonglong),
+            ("ullAvailPageFile", ctypes.c_ulonglong),
+            ("ullTotalVirtual", ctypes.c_ulonglong),
+            ("ullAvailVirtual", ctypes.c_ulonglong),
+            ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+        ]
+
+    _kernel32.GlobalMemoryStatusEx.argtypes = [ctypes.POINTER(MEMORYSTATUSEX)]
+    _kernel32.GlobalMemoryStatusEx.restype = wintypes.BOOL
+
+    # Filled in place on every sample; only the sampling thread reads it
+    _memory_status = MEMORYSTATUSEX(dwLength=ctypes.sizeof(MEMORYSTATUSEX))
+
+    def get_ram_usage():
+        """RAM usage in percent, as the OS already reports it in dwMemoryLoad."""
+        if not _kernel32.GlobalMemoryStatusEx(ctypes.byref(_memory_status)):
+            raise ctypes.WinError(ctypes.get_last_error())
+        return _memory_status.dwMemoryLoad
+
+    _hid_dll = ctypes.WinDLL("hid")
+    for _func in (_hid_dll.HidD_GetManufacturerString, _hid_dll.HidD_GetProductString):
+        _func.argtypes = [wintypes.HANDLE, wintypes.LPVOID, wintypes.ULONG]
+        _func.restype = wintypes.BOOLEAN
+
+    class _WinHidDevice:
+        """Raw HID interface driven with overlapped WriteFile/ReadFile.
+
+        Mirrors the parts of hid.Device used here, but writes straight from
+        the caller's bytearray and reads into a buffer kept for the life of
+        the handle, so no bytes copies are made on the way to the driver.
+        """
+
+        def __init__(self, path):
+            self.handle = _kernel32.CreateFileW(
+                path,
+                GENERIC_READ | GENERIC_WRITE,
+                FILE_SHARE_READ | FILE_SHARE_WRITE,
+                None,
+                OPEN_EXISTING,
+                FILE_FLAG_OVERLAPPED,
+                None,
+            )
+            if self.handle == INVALID_HANDLE_VALUE:
+                raise ctypes.WinError(ctypes.get_last_error())
+
+            self._write_ov = OVERLAPPED()
+            self._read_ov = OVERLAPPED()
+            self._transferred = wintypes.DWORD()
+            self._write_src = None  # bytearray the cached view below shares memory with
+            self._write_view = None
+            self._read_buf = (ctypes.c_ubyte * (REPORT_LENGTH + 1))()
+            self._read_pending = False
+
+            # Nobody else holds the handle yet, so release everything if setup fails
+            try:
+                for ov in (self._write_ov, self._read_ov):
+                    ov.hEvent = _kernel32.CreateEventW(None, True, False, None)
+                    if not ov.hEvent:
+                        raise ctypes.WinError(ctypes.get_last_error())
+
+                self.manufacturer = self._get_string(_hid_dll.HidD_GetManufacturerString)
+                self.product = self._get_string(_hid_dll.HidD_GetProductString)
+            except BaseException:
+                self.close()
+                raise
+
+        def _get_string(self, func):
+            buf = ctypes.create_unicode_buffer(127)
+            if not func(self.handle, buf, ctypes.sizeof(buf)):
+                return ""
+            return buf.value
+
+        def _cancel(self, ov):
+            """Cancel one pending operation and wait until the kernel is done with it."""
+            _kernel32.CancelIoEx(self.handle, ctypes.byref(ov))
+            # The OVERLAPPED and its buffer must stay untouched until this returns
+            _kernel32.GetOverlappedResult(self.handle, ctypes.byref(ov), ctypes.byref(self._transferred), True)
+
+        def write(self, data):
+            if data is not self._write_src:
+                self._write_view = (ctypes.c_ubyte * len(data)).from_buffer(data)
+                self._write_src = data
+            ov = self._write_ov
+            if not _kernel32.WriteFile(self.handle, self._write_view, len(data), None, ctypes.byref(ov)):
+                error = ctypes.get_last_error()
+                if error != ERROR_IO_PENDING:
+                    raise ctypes.WinError(error)
+                result = _kernel32.WaitForSingleObject(ov.hEvent, WRITE_TIMEOUT)
+                if result == WAIT_TIMEOUT:
+                    self._cancel(ov)
+                    raise OSError("HID write timed out")
+                if result != WAIT_OBJECT_0:
+                    error = ctypes.get_last_error()
+                    self._cancel(ov)  # The write may still be in flight
+                    raise ctypes.WinError(error)
+            if not _kernel32.GetOverlappedResult(self.handle, ctypes.byref(ov), ctypes.byref(self._transferred), False):
+                raise ctypes.WinError(ctypes.get_last_error())
+            return self._transferred.value
+
+        def read(self, size, timeout=None):
+            """Read one input report; returns empty bytes if none arrives in time."""
+            ov = self._read_ov
+            # A read that timed out earlier stays queued and is picked up here
+            if not self._read_pending:
+                if not _kernel32.ReadFile(self.handle, self._read_buf, len(self._read_buf), None, ctypes.byref(ov)):
+                    error = ctypes.get_last_error()
+                    if error != ERROR_IO_PENDING:
+                        raise ctypes.WinError(error)
+                self._read_pending = True
+            result = _kernel32.WaitForSingleObject(ov.hEvent, INFINITE if timeout is None else timeout)
+            if result == WAIT_TIMEOUT:
+                return b""
+            if result != WAIT_OBJECT_0:
+                # Still pending, so close() cancels it before the buffer goes away
+                raise ctypes.WinError(ctypes.get_last_error())
+            self._read_pending = False
+            if not _kernel32.GetOverlappedResult(self.handle, ctypes.byref(ov), ctypes.byref(self._transferred), False):
+                raise ctypes.WinError(ctypes.get_last_error())
+            # Drop the report ID byte, as hidapi does
+            return bytes(self._read_buf[1:min(self._transferred.value, size + 1)])
+
+        def close(self):
+            if self._read_pending:
+                self._cancel(self._read_ov)
+                self._read_pending = False
+            for ov in (self._write_ov, self._read_ov):
+                if ov.hEvent:  # Unset if __init__ failed part way
+                    _kernel32.CloseHandle(ov.hEvent)
+            _kernel32.CloseHandle(self.handle)
+
+    def _open_device(path):
+        return _WinHidDevice(path.decode())
+else:
+    import psutil
+
+    _pdh = None
+
+    class _HidapiDevice:
+        """hid.Device behind the same write(bytearray) interface as on Windows."""
+
+        def __init__(self, path):
+            self._device = hid.Device(path=path)
+            self.manufacturer = self._device.manufacturer
+            self.product = self._device.product
+
+        def write(self, data):
+            return self._device.write(bytes(data))  # hidapi's binding only takes bytes
+
+        def read(self, size, timeout=None):
+            return self._device.read(size, timeout=timeout)
+
+        def close(self):
+            self._device.close()
+
+    def _open_device(path):
+        return _HidapiDevice(path)
+
+    def get_ram_usage():
+        """RAM usage in percent."""
+        return int(psutil.virtual_memory().percent)
+
+
+def find_raw_hid_path():
+    """Return the path of the first raw HID interface of the device, or None."""
+    match = next(
+        (
+            i for i in hid.enumerate(VENDOR_ID, PRODUCT_ID)
+            if i["usage_page"] == USAGE_PAGE and i["usage"] == USAGE
+        ),
+        None,
+    )
+    return match["path"] if match else None
+
+
+class HidSession:
+    """Raw HID interface that is opened once and reused across reports."""
+
+    def __init__(self):
+        self.device = None
+        self.path = None  # Path of the last interface opened
+        self.report_buf = bytearray(REPORT_LENGTH + 1)  # Report ID + Data
+
+    def open(self):
+        """Open the interface if needed and return it, or None if no device is found."""
+        if self.device is None and self.path is not None:
+            # Try the interface that worked last time before walking all devices
+            try:
+                self.device = _open_device(self.path)
+            except (OSError, hid.HIDException):
+                self.path = None
+        if self.device is None:
+            self.path = find_raw_hid_path()
+            if self.path is not None:
+                self.device = _open_device(self.path)
+        return self.device
+
+    def close(self):
+        if self.device is not None:
+            self.device.close()
+            self.device = None
+
+    def write(self, report):
+        """Write a report, re-opening the interface once if the write fails."""
+        for retry in (False, True):
+            if retry:
+                self.close()
+            device = self.open()
+            if device is None:
+                raise hid.HIDException("No device found")
+            try:
+                return device.write(report)
+            except (OSError, hid.HIDException):
+                if retry:
+                    raise
+
+    def read(self, timeout):
+        """Read one input report; returns empty bytes if none arrives in time."""
+        return self.device.read(REPORT_LENGTH, timeout=timeout)
+
+
+class CpuSampler:
+    """CPU usage from two consecutive samples.
+
+    On Windows this reads the PDH processor counter directly; elsewhere it
+    falls back to psutil. The baseline is taken on open(), and both backends
+    need about MIN_INTERVAL seconds between samples: sooner, "% Processor
+    Time" sees no elapsed time and reads 0, and the other counters are noise.
+    """
+
+    MIN_INTERVAL = 1.0  # seconds
+
+    def __init__(self):
+        self.cpu_query_handle = None
+        self.cpu_counter_handle = None
+        if _pdh is not None:
+            self.cpu_counter_type = wintypes.DWORD()
+            self.cpu_raw_value = PDH_RAW_COUNTER()
+        self.cpu_raw_sample = None  # Previous (timestamp, first, second) sample
+        self.open()
+
+    def open(self):
+        """Initialize performance counter for CPU usage."""
+        if _pdh is None:
+            # Prime psutil so later calls can report the delta without sleeping
+            psutil.cpu_percent(interval=None)
+            return
+
+        query_handle = wintypes.HANDLE()
+        _pdh.PdhOpenQueryW(None, 0, ctypes.byref(query_handle))
+        self.cpu_query_handle = query_handle
+
+        try:
+            counter_handle = wintypes.HANDLE()
+            _pdh.PdhAddEnglishCounterW(
+                self.cpu_query_handle, CPU_COUNTER_PATH, 0, ctypes.byref(counter_handle)
+            )
+            self.cpu_counter_handle = counter_handle
+
+            # Collect initial data to establish a baseline
+            _pdh.PdhCollectQueryData(self.cpu_query_handle)
+            self.cpu_raw_sample = self.read_raw_cpu_counter()
+        except OSError:
+            self.close()  # Don't leak the query when a caller retries
+            raise
+
+    def close(self):
+        if self.cpu_query_handle is not None:
+            _pdh.PdhCloseQuery(self.cpu_query_handle)
+            self.cpu_query_handle = None
+            self.cpu_counter_handle = None
+
+    def read_raw_cpu_counter(self):
+        """Return the current raw CPU counter as (timestamp, first, second)."""
+        _pdh.PdhGetRawCounterValue(
+            self.cpu_counter_handle,
+            ctypes.byref(self.cpu_counter_type),
+            ctypes.byref(self.cpu_raw_value),
+        )
+        raw = self.cpu_raw_value
+        timestamp = (raw.TimeStamp.dwHighDateTime << 32) | raw.TimeStamp.dwLowDateTime
+        return timestamp, raw.FirstValue, raw.SecondValue
+
+    def sample(self):
+        """Fetch CPU usage in percent since the previous sample."""
+        if _pdh is None:
+            return int(psutil.cpu_percent(interval=0.0))
+
+        _pdh.PdhCollectQueryData(self.cpu_query_handle)
+        sample = self.read_raw_cpu_counter()
+        prev_timestamp, prev_first, prev_second = self.cpu_raw_sample
+        self.cpu_raw_sample = sample
+        timestamp, first, second = sample
+
+        if self.cpu_counter_type.value == PERF_100NSEC_TIMER_INV:
+            # Idle time against elapsed time, both in 100 ns units
+            total_delta = timestamp - prev_timestamp
+            if total_delta <= 0:
+                return 0
+            usage = 100 - (first - prev_first) * 100 // total_delta
+        else:
+            # Averaged counters carry their base in the second value
+            total_delta = second - prev_second
+            if total_delta <= 0:
+                return 0
+            usage = (first - prev_first) * 100 // total_delta
+        return max(0, min(100, usage))
+
+
+def get_system_metrics(cpu_sampler):
+    """Fetch system metrics: CPU and RAM usage."""
+    return cpu_sampler.sample(), get_ram_usage()
+
+
+# Command byte + CPU + RAM; refilled on every sample by the sampling thread
+_DATA = bytearray(3)
+_DATA[0] = 0x01
+
+
+def construct_data(cpu, ram):
+    """Command byte + CPU + RAM values, each limited to a single byte."""
+    _DATA[1] = cpu & 0xFF
+    _DATA[2] = ram & 0xFF
+    return _DATA
+
+
+def send_raw_report(session, data):
+    """Send the 3-byte command payload as one HID report."""
+    # Copy the payload into the preallocated report in place
+    session.report_buf[1:4] = data
+    session.write(session.report_buf)